@@ -0,0 +1,117 @@
+"""
+Numba-compiled kernels for distance matrix calculations.
+
+Importing this module requires numba; callers should fall back to the
+NumPy implementation in utils.py when it is not installed.
+
+Coordinates and all intermediate values are float64. Computing the haversine
+in float32 loses tens of meters in general and kilometers for near-antipodal
+pairs, where asin(sqrt(a)) is evaluated with a close to 1. Only the output is
+O(N^2), so it alone is narrowed, to int32.
+"""
+from math import asin, pi, sin, sqrt
+import numpy as np
+from numba import njit, prange
+
+# Kernels are compiled eagerly for this signature when the module is imported.
+# They release the GIL so the API can run them in a thread off the event loop.
+KERNEL_SIGNATURE = "int32[:, ::1](float64[::1], float64[::1], float64)"
+
+# Side of the square tiles the matrix is filled in, so that the rows and
+# mirrored columns being written stay in cache
+BLOCK_SIZE = 64
+
+
+@njit(KERNEL_SIGNATURE, parallel=True, fastmath=True, nogil=True, cache=True)
+def haversine_matrix(lat, lng, R):
+    """
+    Calculate the haversine distance matrix in a single fused loop.
+
+    Args:
+        lat: 1D float64 array of latitudes in radians
+        lng: 1D float64 array of longitudes in radians
+        R: Sphere radius, determines the distance unit (float64)
+
+    Returns:
+        Symmetric (n, n) int32 matrix of truncated distances
+    """
+    n = lat.shape[0]
+    distance_matrix = np.zeros((n, n), dtype=np.int32)
+    diameter = 2.0 * R
+    # cos(lat) depends on a single point, so compute it n times rather than per pair
+    clat = np.cos(lat)
+    n_blocks = (n + BLOCK_SIZE - 1) // BLOCK_SIZE
+    # Row tile b has n_blocks - b tiles on or above the diagonal, so pairing
+    # it with row tile n_blocks - 1 - b gives every iteration the same work
+    for pair in prange((n_blocks + 1) // 2):
+        for half in range(2):
+            block = pair if half == 0 else n_blocks - 1 - pair
+            if half == 1 and block == pair:
+                break
+            ii = block * BLOCK_SIZE
+            i_end = min(ii + BLOCK_SIZE, n)
+            for jj in range(ii, n, BLOCK_SIZE):
+                j_end = min(jj + BLOCK_SIZE, n)
+                for i in range(ii, i_end):
+                    lat_i = lat[i]
+                    lng_i = lng[i]
+                    clat_i = clat[i]
+                    for j in range(max(jj, i + 1), j_end):
+                        sin_dlat = sin((lat_i - lat[j]) * 0.5)
+                        sin_dlng = sin((lng_i - lng[j]) * 0.5)
+                        a = sin_dlat * sin_dlat + clat_i * clat[j] * sin_dlng * sin_dlng
+                        d = np.int32(diameter * asin(sqrt(min(a, 1.0))))
+                        distance_matrix[i, j] = d
+                        distance_matrix[j, i] = d
+    return distance_matrix
+
+
+@njit(KERNEL_SIGNATURE, parallel=True, fastmath=True, nogil=True, cache=True)
+def equirectangular_matrix(lat, lng, R):
+    """
+    Calculate the equirectangular distance matrix in a single fused loop.
+
+    The longitude difference of each pair is scaled by the mean of the two
+    points' cos(lat), which is computed once per point, so no trigonometry
+    is evaluated per pair.
+
+    Args:
+        lat: 1D float64 array of latitudes in radians
+        lng: 1D float64 array of longitudes in radians
+        R: Sphere radius, determines the distance unit (float64)
+
+    Returns:
+        Symmetric (n, n) int32 matrix of truncated distances
+    """
+    n = lat.shape[0]
+    distance_matrix = np.zeros((n, n), dtype=np.int32)
+    clat = np.cos(lat)
+    n_blocks = (n + BLOCK_SIZE - 1) // BLOCK_SIZE
+    # Row tile b has n_blocks - b tiles on or above the diagonal, so pairing
+    # it with row tile n_blocks - 1 - b gives every iteration the same work
+    for pair in prange((n_blocks + 1) // 2):
+        for half in range(2):
+            block = pair if half == 0 else n_blocks - 1 - pair
+            if half == 1 and block == pair:
+                break
+            ii = block * BLOCK_SIZE
+            i_end = min(ii + BLOCK_SIZE, n)
+            for jj in range(ii, n, BLOCK_SIZE):
+                j_end = min(jj + BLOCK_SIZE, n)
+                for i in range(ii, i_end):
+                    lat_i = lat[i]
+                    lng_i = lng[i]
+                    clat_i = clat[i]
+                    for j in range(max(jj, i + 1), j_end):
+                        dlng = lng_i - lng[j]
+                        # Take the short way around the antimeridian
+                        if dlng > pi:
+                            dlng -= 2 * pi
+                        elif dlng < -pi:
+                            dlng += 2 * pi
+                        dx = 0.5 * (clat_i + clat[j]) * dlng
+                        dy = lat_i - lat[j]
+                        d = np.int32(R * sqrt(dx * dx + dy * dy))
+                        distance_matrix[i, j] = d
+                        distance_matrix[j, i] = d
+    return distance_matrix
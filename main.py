@@ -1,13 +1,21 @@
 """
 FastAPI application for Vehicle Routing Problem optimization.
 """
+import asyncio
 import logging
-from typing import List, Optional, Dict, Any
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, ClassVar, Dict, List, Literal, Optional
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field, validator
+import numpy as np
 
 from utils import calculate_distance_matrix
-from solver import solve_vrp
+from solver import solve_vrp, MULTI_START_STRATEGIES
 
 # Configure logging
 logging.basicConfig(
@@ -16,11 +24,31 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def _create_solver_pool() -> ProcessPoolExecutor:
+    """Create the process pool the solver runs in."""
+    # Spawn rather than fork: the parent may already run Numba worker threads
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the solver process pool on startup and shut it down on exit."""
+    app.state.solver_pool = _create_solver_pool()
+    yield
+    # Don't wait for running solves, which would block the event loop for up to the time limit
+    app.state.solver_pool.shutdown(wait=False, cancel_futures=True)
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Vehicle Routing Problem Optimizer",
     description="Solve VRP using Google OR-Tools with FastAPI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -31,13 +59,18 @@ class Location(BaseModel):
     lng: float = Field(..., ge=-180, le=180, description="Longitude")
 
 
-class VRPRequest(BaseModel):
-    """Request model for VRP optimization."""
-    locations: List[Location] = Field(..., min_items=2, description="List of locations (first is depot)")
+class _VRPRequestBase(BaseModel):
+    """Fields and validation shared by the VRP request models."""
+    # Name of the subclass field whose length is the number of locations
+    locations_field: ClassVar[str]
+    
     num_vehicles: int = Field(..., gt=0, description="Number of vehicles available")
     vehicle_capacities: Optional[List[int]] = Field(None, description="Optional vehicle capacities for CVRP")
-    demands: Optional[List[int]] = Field(None, description="Optional demands for each location (depot should be 0)")
     time_limit_seconds: int = Field(30, gt=0, le=300, description="Time limit for solver in seconds")
+    metric: Literal['haversine', 'equirect'] = Field(
+        'haversine',
+        description="Distance metric: 'haversine' is the exact Great Circle distance, 'equirect' is a faster planar approximation for city-scale problems only"
+    )
     
     @validator('vehicle_capacities')
     def validate_capacities(cls, v, values):
@@ -47,17 +80,63 @@ class VRPRequest(BaseModel):
                 raise ValueError(f"Number of capacities must match num_vehicles ({values['num_vehicles']})")
         return v
     
-    @validator('demands')
+    # Subclasses declare demands after their locations field, so that the
+    # locations are already validated when this runs
+    @validator('demands', check_fields=False)
     def validate_demands(cls, v, values):
         """Validate that demands match number of locations."""
-        if v is not None and 'locations' in values:
-            if len(v) != len(values['locations']):
-                raise ValueError(f"Number of demands must match number of locations ({len(values['locations'])})")
+        if v is not None and cls.locations_field in values:
+            num_locations = len(values[cls.locations_field])
+            if len(v) != num_locations:
+                raise ValueError(f"Number of demands must match number of locations ({num_locations})")
             if v[0] != 0:
                 raise ValueError("Depot (first location) demand must be 0")
         return v
 
 
+class VRPRequest(_VRPRequestBase):
+    """Request model for VRP optimization."""
+    locations_field: ClassVar[str] = 'locations'
+    
+    locations: List[Location] = Field(..., min_items=2, description="List of locations (first is depot)")
+    demands: Optional[List[int]] = Field(None, description="Optional demands for each location (depot should be 0)")
+
+
+class VRPBatchRequest(_VRPRequestBase):
+    """Request model for VRP optimization with coordinates as flat arrays."""
+    locations_field: ClassVar[str] = 'lats'
+    
+    lats: List[float] = Field(..., min_items=2, description="Latitudes (first is depot)")
+    lngs: List[float] = Field(..., min_items=2, description="Longitudes (first is depot)")
+    ids: List[str] = Field(..., min_items=2, description="Unique identifiers for the locations")
+    demands: Optional[List[int]] = Field(None, description="Optional demands for each location (depot should be 0)")
+    
+    @validator('lats')
+    def validate_lats(cls, v):
+        """Validate all latitudes in a single vectorized check."""
+        lats = np.asarray(v, dtype=np.float64)
+        if not np.all((lats >= -90) & (lats <= 90)):
+            raise ValueError("Latitudes must be between -90 and 90")
+        return v
+    
+    @validator('lngs')
+    def validate_lngs(cls, v, values):
+        """Validate all longitudes in a single vectorized check."""
+        lngs = np.asarray(v, dtype=np.float64)
+        if not np.all((lngs >= -180) & (lngs <= 180)):
+            raise ValueError("Longitudes must be between -180 and 180")
+        if 'lats' in values and len(v) != len(values['lats']):
+            raise ValueError(f"Number of longitudes must match number of latitudes ({len(values['lats'])})")
+        return v
+    
+    @validator('ids')
+    def validate_ids(cls, v, values):
+        """Validate that ids match number of locations."""
+        if 'lats' in values and len(v) != len(values['lats']):
+            raise ValueError(f"Number of ids must match number of locations ({len(values['lats'])})")
+        return v
+
+
 class Route(BaseModel):
     """Route model for a single vehicle."""
     vehicle_id: int = Field(..., description="Vehicle identifier")
@@ -74,6 +153,110 @@ class VRPResponse(BaseModel):
     message: Optional[str] = Field(None, description="Additional information or error message")
 
 
+async def _solve(
+    lats: np.ndarray,
+    lngs: np.ndarray,
+    location_ids: List[str],
+    num_vehicles: int,
+    vehicle_capacities: Optional[List[int]],
+    demands: Optional[List[int]],
+    time_limit_seconds: int,
+    metric: str
+) -> VRPResponse:
+    """
+    Build the distance matrix, solve the VRP in the solver pool and build
+    the response.
+    
+    Args:
+        lats: Latitudes in degrees (first is depot)
+        lngs: Longitudes in degrees (first is depot)
+        location_ids: Location identifiers, in the same order as the coordinates
+        num_vehicles: Number of vehicles available
+        vehicle_capacities: Optional vehicle capacities for CVRP
+        demands: Optional demands for each location
+        time_limit_seconds: Time limit for the solver
+        metric: Distance metric, "haversine" or "equirect"
+        
+    Returns:
+        VRP solution with routes and total distance
+    """
+    # Build the distance matrix once, in a thread so the event loop stays free
+    logger.info("Calculating distance matrix...")
+    distance_matrix = await asyncio.to_thread(calculate_distance_matrix, lats, lngs, metric)
+    
+    # Solve from several first solution strategies in parallel, off the event loop
+    logger.info("Solving VRP...")
+    loop = asyncio.get_running_loop()
+    strategies = MULTI_START_STRATEGIES[:os.cpu_count() or 1]
+    pool = app.state.solver_pool
+    try:
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                pool,
+                partial(
+                    solve_vrp,
+                    distance_matrix=distance_matrix,
+                    num_vehicles=num_vehicles,
+                    depot_index=0,
+                    vehicle_capacities=vehicle_capacities,
+                    demands=demands,
+                    time_limit_seconds=time_limit_seconds,
+                    first_solution_strategy=strategy
+                )
+            )
+            for strategy in strategies
+        ))
+    except BrokenProcessPool:
+        # A worker died (e.g. crashed or OOM-killed); replace the pool so later
+        # requests don't all fail. Concurrent requests may race here, so only
+        # the first one to notice swaps it.
+        if app.state.solver_pool is pool:
+            logger.error("Solver pool is broken, recreating it")
+            app.state.solver_pool = _create_solver_pool()
+            pool.shutdown(wait=False)
+        raise
+    
+    # Keep the shortest solution; if none was found, report the first error
+    solved = [result for result in results if not result.get("error")]
+    solution = min(solved or results[:1], key=lambda result: result["total_distance"] or 0)
+    
+    # Check if solution was found
+    if solution.get("error"):
+        logger.error("Solver error: %s", solution["error"])
+        return VRPResponse(
+            total_distance=0,
+            routes=[],
+            unvisited_nodes=location_ids,
+            success=False,
+            message=solution["error"]
+        )
+    
+    # Convert routes from indices to location IDs with array indexing
+    ids = np.array(location_ids, dtype=object)
+    routes = []
+    for vehicle_id, route in enumerate(solution["routes"]):
+        route_ids = ids[route["indices"]].tolist()
+        
+        routes.append(Route(
+            vehicle_id=vehicle_id,
+            location_ids=route_ids,
+            distance=route["distance"]
+        ))
+    
+    # Convert unvisited nodes to location IDs
+    unvisited_ids = ids[solution["unvisited_nodes"]].tolist()
+    
+    logger.info("Optimization successful. Total distance: %dm", solution["total_distance"])
+    
+    return VRPResponse(
+        total_distance=solution["total_distance"],
+        routes=routes,
+        unvisited_nodes=unvisited_ids,
+        success=True,
+        message="Optimization completed successfully"
+    )
+
+
 @app.get("/")
 async def root() -> Dict[str, str]:
     """Root endpoint with API information."""
@@ -81,7 +264,8 @@ async def root() -> Dict[str, str]:
         "name": "Vehicle Routing Problem Optimizer",
         "version": "1.0.0",
         "description": "Solve VRP using Google OR-Tools",
-        "endpoint": "POST /optimize"
+        "endpoint": "POST /optimize",
+        "batch_endpoint": "POST /optimize_batch"
     }
 
 
@@ -106,77 +290,69 @@ async def optimize_routes(request: VRPRequest) -> VRPResponse:
         HTTPException: If there's an error in processing or solving
     """
     try:
-        logger.info(f"Received optimization request for {len(request.locations)} locations and {request.num_vehicles} vehicles")
+        logger.info("Received optimization request for %d locations and %d vehicles", len(request.locations), request.num_vehicles)
         
-        # Extract location data
-        location_data = [
-            {"lat": loc.lat, "lng": loc.lng}
-            for loc in request.locations
-        ]
+        # Extract coordinates as contiguous arrays
+        num_locations = len(request.locations)
+        lats = np.fromiter((loc.lat for loc in request.locations), dtype=np.float64, count=num_locations)
+        lngs = np.fromiter((loc.lng for loc in request.locations), dtype=np.float64, count=num_locations)
         location_ids = [loc.id for loc in request.locations]
         
-        # Calculate distance matrix
-        logger.info("Calculating distance matrix...")
-        distance_matrix = calculate_distance_matrix(location_data)
-        
-        # Solve VRP
-        logger.info("Solving VRP...")
-        solution = solve_vrp(
-            distance_matrix=distance_matrix,
+        return await _solve(
+            lats=lats,
+            lngs=lngs,
+            location_ids=location_ids,
             num_vehicles=request.num_vehicles,
-            depot_index=0,
             vehicle_capacities=request.vehicle_capacities,
             demands=request.demands,
-            time_limit_seconds=request.time_limit_seconds
+            time_limit_seconds=request.time_limit_seconds,
+            metric=request.metric
         )
         
-        # Check if solution was found
-        if solution.get("error"):
-            logger.error(f"Solver error: {solution['error']}")
-            return VRPResponse(
-                total_distance=0,
-                routes=[],
-                unvisited_nodes=location_ids,
-                success=False,
-                message=solution["error"]
-            )
-        
-        # Convert routes from indices to location IDs
-        routes = []
-        for vehicle_id, route_indices in enumerate(solution["routes"]):
-            route_ids = [location_ids[idx] for idx in route_indices]
-            
-            # Calculate route distance
-            route_distance = 0
-            for i in range(len(route_indices) - 1):
-                from_idx = route_indices[i]
-                to_idx = route_indices[i + 1]
-                route_distance += distance_matrix[from_idx][to_idx]
-            
-            routes.append(Route(
-                vehicle_id=vehicle_id,
-                location_ids=route_ids,
-                distance=route_distance
-            ))
+    except ValueError as e:
+        logger.error("Validation error: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Unexpected error: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.post("/optimize_batch", response_model=VRPResponse)
+async def optimize_routes_batch(request: VRPBatchRequest) -> VRPResponse:
+    """
+    Optimize vehicle routes from coordinates given as flat arrays.
+    
+    Equivalent to /optimize, but avoids building a Location object per point,
+    which keeps parsing cheap for large requests.
+    
+    Args:
+        request: VRP batch request with coordinate arrays, vehicles, and optional constraints
         
-        # Convert unvisited nodes to location IDs
-        unvisited_ids = [location_ids[idx] for idx in solution["unvisited_nodes"]]
+    Returns:
+        VRP solution with routes and total distance
         
-        logger.info(f"Optimization successful. Total distance: {solution['total_distance']}m")
+    Raises:
+        HTTPException: If there's an error in processing or solving
+    """
+    try:
+        logger.info("Received batch optimization request for %d locations and %d vehicles", len(request.lats), request.num_vehicles)
         
-        return VRPResponse(
-            total_distance=solution["total_distance"],
-            routes=routes,
-            unvisited_nodes=unvisited_ids,
-            success=True,
-            message="Optimization completed successfully"
+        return await _solve(
+            lats=np.asarray(request.lats, dtype=np.float64),
+            lngs=np.asarray(request.lngs, dtype=np.float64),
+            location_ids=request.ids,
+            num_vehicles=request.num_vehicles,
+            vehicle_capacities=request.vehicle_capacities,
+            demands=request.demands,
+            time_limit_seconds=request.time_limit_seconds,
+            metric=request.metric
         )
         
     except ValueError as e:
-        logger.error(f"Validation error: {str(e)}")
+        logger.error("Validation error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        logger.error("Unexpected error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
@@ -2,39 +2,53 @@
 OR-Tools VRP solver implementation.
 """
 import logging
+from functools import lru_cache
 from typing import List, Dict, Optional, Tuple
+import numpy as np
 from ortools.constraint_solver import routing_enums_pb2
+from ortools.constraint_solver import routing_parameters_pb2
 from ortools.constraint_solver import pywrapcp
 
 logger = logging.getLogger(__name__)
 
+# First solution strategies used for parallel multi-start solving
+MULTI_START_STRATEGIES = (
+    routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC,
+    routing_enums_pb2.FirstSolutionStrategy.SAVINGS,
+    routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
+    routing_enums_pb2.FirstSolutionStrategy.CHRISTOFIDES,
+)
+
 
 def solve_vrp(
-    distance_matrix: List[List[int]],
+    distance_matrix: np.ndarray,
     num_vehicles: int,
     depot_index: int = 0,
     vehicle_capacities: Optional[List[int]] = None,
     demands: Optional[List[int]] = None,
-    time_limit_seconds: int = 30
+    time_limit_seconds: int = 30,
+    first_solution_strategy: int = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
 ) -> Dict:
     """
     Solve the Vehicle Routing Problem using OR-Tools.
     
     Args:
-        distance_matrix: 2D list of distances between locations
+        distance_matrix: 2D int32 array of distances between locations
         num_vehicles: Number of vehicles available
         depot_index: Index of the depot location (default: 0)
         vehicle_capacities: Optional list of vehicle capacities for CVRP
         demands: Optional list of demands for each location (depot should be 0)
         time_limit_seconds: Time limit for the solver
+        first_solution_strategy: OR-Tools FirstSolutionStrategy value
         
     Returns:
         Dictionary containing:
             - total_distance: Total distance of all routes
-            - routes: List of routes, each route is a list of location indices
+            - routes: List of routes, each a dict with the ordered location
+              "indices" and the route "distance"
             - unvisited_nodes: List of location indices that were not visited
     """
-    logger.info(f"Solving VRP with {num_vehicles} vehicles and {len(distance_matrix)} locations")
+    logger.info("Solving VRP with %d vehicles and %d locations", num_vehicles, len(distance_matrix))
     
     # Create the routing index manager
     manager = pywrapcp.RoutingIndexManager(
@@ -46,14 +60,9 @@ def solve_vrp(
     # Create Routing Model
     routing = pywrapcp.RoutingModel(manager)
     
-    # Create and register distance callback
-    def distance_callback(from_index: int, to_index: int) -> int:
-        """Returns the distance between the two nodes."""
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return distance_matrix[from_node][to_node]
-    
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    # Register the distance matrix; lookups happen in C++ without a Python callback.
+    # The binding only accepts nested lists, so convert at this boundary.
+    transit_callback_index = routing.RegisterTransitMatrix(distance_matrix.tolist())
     
     # Define cost of each arc
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
@@ -62,12 +71,7 @@ def solve_vrp(
     if vehicle_capacities is not None and demands is not None:
         logger.info("Adding capacity constraints")
         
-        def demand_callback(from_index: int) -> int:
-            """Returns the demand of the node."""
-            from_node = manager.IndexToNode(from_index)
-            return demands[from_node]
-        
-        demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
+        demand_callback_index = routing.RegisterUnaryTransitVector(demands)
         
         routing.AddDimensionWithVehicleCapacity(
             demand_callback_index,
@@ -77,15 +81,7 @@ def solve_vrp(
             'Capacity'
         )
     
-    # Setting first solution heuristic
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-    )
-    search_parameters.local_search_metaheuristic = (
-        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-    )
-    search_parameters.time_limit.seconds = time_limit_seconds
+    search_parameters = _search_parameters(first_solution_strategy, time_limit_seconds)
     
     # Solve the problem
     logger.info("Starting OR-Tools solver...")
@@ -104,6 +100,35 @@ def solve_vrp(
         }
 
 
+@lru_cache(maxsize=128)
+def _search_parameters(
+    first_solution_strategy: int,
+    time_limit_seconds: int
+) -> routing_parameters_pb2.RoutingSearchParameters:
+    """
+    Build the search parameters for a strategy and time limit.
+    
+    The routing model itself cannot be reused, since OR-Tools does not allow
+    swapping the distance matrix of a closed model, but the parameters only
+    depend on these two values and are cached per process. Callers must not
+    modify the returned message.
+    
+    Args:
+        first_solution_strategy: OR-Tools FirstSolutionStrategy value
+        time_limit_seconds: Time limit for the solver
+        
+    Returns:
+        RoutingSearchParameters using guided local search
+    """
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = first_solution_strategy
+    search_parameters.local_search_metaheuristic = (
+        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    )
+    search_parameters.time_limit.seconds = time_limit_seconds
+    return search_parameters
+
+
 def _extract_solution(
     manager: pywrapcp.RoutingIndexManager,
     routing: pywrapcp.RoutingModel,
@@ -124,7 +149,7 @@ def _extract_solution(
     """
     total_distance = 0
     routes = []
-    visited_nodes = set()
+    visited = np.zeros(manager.GetNumberOfNodes(), dtype=bool)
     
     for vehicle_id in range(num_vehicles):
         route = []
@@ -134,7 +159,7 @@ def _extract_solution(
         while not routing.IsEnd(index):
             node_index = manager.IndexToNode(index)
             route.append(node_index)
-            visited_nodes.add(node_index)
+            visited[node_index] = True
             
             previous_index = index
             index = solution.Value(routing.NextVar(index))
@@ -143,20 +168,20 @@ def _extract_solution(
         # Add the depot at the end
         node_index = manager.IndexToNode(index)
         route.append(node_index)
-        visited_nodes.add(node_index)
+        visited[node_index] = True
         
-        routes.append(route)
+        routes.append({"indices": route, "distance": route_distance})
         total_distance += route_distance
         
-        logger.info(f"Vehicle {vehicle_id}: Route {route}, Distance: {route_distance}m")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Vehicle %d: Route %s, Distance: %dm", vehicle_id, route, route_distance)
     
     # Find unvisited nodes
-    all_nodes = set(range(manager.GetNumberOfNodes()))
-    unvisited_nodes = list(all_nodes - visited_nodes)
+    unvisited_nodes = np.flatnonzero(~visited).tolist()
     
-    logger.info(f"Total distance: {total_distance}m")
+    logger.info("Total distance: %dm", total_distance)
     if unvisited_nodes:
-        logger.warning(f"Unvisited nodes: {unvisited_nodes}")
+        logger.warning("Unvisited nodes: %s", unvisited_nodes)
     
     return {
         "total_distance": total_distance,
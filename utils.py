@@ -1,38 +1,196 @@
 """
 Utility functions for distance calculations in VRP.
 """
+import hashlib
 import logging
-from typing import List, Dict
-from geopy.distance import great_circle
+import threading
+from typing import Callable
+import numpy as np
+from cachetools import LRUCache
+
+try:
+    from fast_dist import haversine_matrix, equirectangular_matrix
+except ImportError:
+    haversine_matrix = None
+    equirectangular_matrix = None
+
+try:
+    from sklearn.metrics.pairwise import haversine_distances
+except ImportError:
+    haversine_distances = None
 
 logger = logging.getLogger(__name__)
 
+# Mean Earth radius in meters (same value geopy's great_circle uses)
+EARTH_RADIUS_METERS = 6371009.0
+
+# Tile size for the NumPy fallbacks, large enough to amortize per-tile
+# overhead while keeping the per-tile temporaries cache-sized
+NUMPY_BLOCK_SIZE = 256
+
+# Coordinates are rounded to this many decimals (~10cm) before hashing
+CACHE_COORDINATE_DECIMALS = 6
+
+# Upper bound on the total size of cached distance matrices
+DISTANCE_MATRIX_CACHE_BYTES = 128 * 2**20
+
+# Distance matrices are cached per coordinate set. Only the API process builds
+# matrices (solver pool workers receive them ready-made), so there is a single
+# cache shared by all requests rather than one per worker.
+_DISTANCE_MATRIX_CACHE = LRUCache(maxsize=DISTANCE_MATRIX_CACHE_BYTES, getsizeof=lambda matrix: matrix.nbytes)
+
+# Serializes matrix builds: the cache is not thread-safe, Numba's default
+# workqueue threading layer must not be entered from several threads at once,
+# and each build already uses every core
+_DISTANCE_MATRIX_LOCK = threading.Lock()
+
+
+def _blocked_symmetric_matrix(
+    num_locations: int,
+    block_distances: Callable[[slice, slice], np.ndarray]
+) -> np.ndarray:
+    """
+    Fill a symmetric distance matrix tile by tile.
+
+    Only tiles on or above the diagonal are computed, each is mirrored into
+    the lower triangle, and temporaries stay tile-sized instead of N x N.
+
+    Args:
+        num_locations: Number of locations
+        block_distances: Returns the distances in meters between the
+            locations in a row slice and a column slice
+
+    Returns:
+        Symmetric int32 matrix of distances in meters
+    """
+    distance_matrix = np.zeros((num_locations, num_locations), dtype=np.int32)
+    for ii in range(0, num_locations, NUMPY_BLOCK_SIZE):
+        rows = slice(ii, min(ii + NUMPY_BLOCK_SIZE, num_locations))
+        for jj in range(ii, num_locations, NUMPY_BLOCK_SIZE):
+            cols = slice(jj, min(jj + NUMPY_BLOCK_SIZE, num_locations))
+            block = block_distances(rows, cols).astype(np.int32)
+            distance_matrix[rows, cols] = block
+            distance_matrix[cols, rows] = block.T
+    return distance_matrix
+
+
+def _haversine_matrix_numpy(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """
+    Calculate the haversine distance matrix with NumPy.
+
+    Args:
+        lat: Latitudes in radians
+        lng: Longitudes in radians
+
+    Returns:
+        Symmetric int32 matrix of distances in meters
+    """
+    clat = np.cos(lat)
+
+    def block_distances(rows: slice, cols: slice) -> np.ndarray:
+        dlat = lat[rows, None] - lat[None, cols]
+        dlng = lng[rows, None] - lng[None, cols]
+        a = np.sin(dlat / 2) ** 2 + clat[rows, None] * clat[None, cols] * np.sin(dlng / 2) ** 2
+        return (2 * EARTH_RADIUS_METERS) * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    return _blocked_symmetric_matrix(len(lat), block_distances)
 
-def calculate_distance_matrix(locations: List[Dict[str, float]]) -> List[List[int]]:
+
+def _equirectangular_matrix_numpy(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
     """
-    Calculate the Great Circle distance matrix between all locations.
-    
+    Calculate the equirectangular distance matrix with NumPy.
+
+    The longitude difference of each pair is scaled by the mean of the two
+    points' cos(lat), so cos is evaluated once per point, not per pair.
+
     Args:
-        locations: List of dictionaries with 'lat' and 'lng' keys
-        
+        lat: Latitudes in radians
+        lng: Longitudes in radians
+
     Returns:
-        Distance matrix as a 2D list where distances are in meters (as integers)
-    """
-    num_locations = len(locations)
-    distance_matrix = [[0] * num_locations for _ in range(num_locations)]
-    
-    for i in range(num_locations):
-        for j in range(num_locations):
-            if i == j:
-                distance_matrix[i][j] = 0
-            else:
-                # Calculate great circle distance
-                coord_i = (locations[i]['lat'], locations[i]['lng'])
-                coord_j = (locations[j]['lat'], locations[j]['lng'])
-                
-                # Distance in meters, converted to integer
-                distance = great_circle(coord_i, coord_j).meters
-                distance_matrix[i][j] = int(distance)
-    
-    logger.info(f"Calculated distance matrix for {num_locations} locations")
+        Symmetric int32 matrix of distances in meters
+    """
+    clat = np.cos(lat)
+
+    def block_distances(rows: slice, cols: slice) -> np.ndarray:
+        # Wrap longitude differences so pairs across the antimeridian take the short way
+        dlng = (lng[rows, None] - lng[None, cols] + np.pi) % (2 * np.pi) - np.pi
+        dlat = lat[rows, None] - lat[None, cols]
+        dx = 0.5 * (clat[rows, None] + clat[None, cols]) * dlng
+        return EARTH_RADIUS_METERS * np.hypot(dx, dlat)
+
+    return _blocked_symmetric_matrix(len(lat), block_distances)
+
+
+def _coordinates_key(lats: np.ndarray, lngs: np.ndarray, metric: str) -> bytes:
+    """Hash the metric and rounded coordinates into a distance matrix cache key."""
+    coords = np.round(np.stack([lats, lngs]).astype(np.float64), CACHE_COORDINATE_DECIMALS)
+    return hashlib.blake2b(coords.tobytes(), person=metric.encode()).digest()
+
+
+def calculate_distance_matrix(lats: np.ndarray, lngs: np.ndarray, metric: str = "haversine") -> np.ndarray:
+    """
+    Calculate the distance matrix between all locations.
+
+    The "haversine" metric gives Great Circle distances. It uses the Numba
+    kernel from fast_dist when numba is installed, then scikit-learn's
+    haversine_distances, and finally the vectorized NumPy implementation.
+
+    The "equirect" metric treats each pair as flat, scaling the longitude
+    difference by the mean cos(lat) of the two points, and needs no
+    trigonometry per pair. For spans up to ~300km below 70 degrees latitude
+    it stays within 0.1% of the Great Circle distance. The error grows with
+    the span and latitude (0.3% at 60 and 0.8% at 70 degrees for a 1000km
+    span), so it should only be used for city or regional scale problems.
+
+    Results are cached by metric and coordinates in this process, so
+    repeated requests for the same locations skip the computation. The
+    function is thread-safe; concurrent calls are serialized.
+
+    Args:
+        lats: 1D float64 array of latitudes in degrees
+        lngs: 1D float64 array of longitudes in degrees
+        metric: Either "haversine" or "equirect"
+
+    Returns:
+        C-contiguous int32 distance matrix in meters (read-only, as it may be
+        shared with other callers through the cache)
+    """
+    if metric not in ("haversine", "equirect"):
+        raise ValueError(f"Unknown distance metric: {metric}")
+
+    with _DISTANCE_MATRIX_LOCK:
+        return _calculate_distance_matrix(lats, lngs, metric)
+
+
+def _calculate_distance_matrix(lats: np.ndarray, lngs: np.ndarray, metric: str) -> np.ndarray:
+    """Look up or build the distance matrix; callers must hold _DISTANCE_MATRIX_LOCK."""
+    num_locations = len(lats)
+    key = _coordinates_key(lats, lngs, metric)
+    cached = _DISTANCE_MATRIX_CACHE.get(key)
+    if cached is not None:
+        logger.info("Using cached distance matrix for %d locations", num_locations)
+        return cached
+
+    lat = np.radians(lats)
+    lng = np.radians(lngs)
+
+    if metric == "equirect":
+        if equirectangular_matrix is not None:
+            distance_matrix = equirectangular_matrix(lat, lng, EARTH_RADIUS_METERS)
+        else:
+            distance_matrix = _equirectangular_matrix_numpy(lat, lng)
+    elif haversine_matrix is not None:
+        distance_matrix = haversine_matrix(lat, lng, EARTH_RADIUS_METERS)
+    elif haversine_distances is not None:
+        coords = np.stack([lat, lng], axis=1)
+        distance_matrix = (haversine_distances(coords) * EARTH_RADIUS_METERS).astype(np.int32)
+    else:
+        distance_matrix = _haversine_matrix_numpy(lat, lng)
+
+    distance_matrix.flags.writeable = False
+    if distance_matrix.nbytes <= _DISTANCE_MATRIX_CACHE.maxsize:
+        _DISTANCE_MATRIX_CACHE[key] = distance_matrix
+
+    logger.info("Calculated distance matrix for %d locations", num_locations)
     return distance_matrix